@@ -4,7 +4,11 @@ VRChat Prometheus Exporter — Enhanced Edition
 Collects rich metrics from the VRChat API with smart rate limiting.
 
 Rate limiting strategy:
-  - All requests are gated through a single throttle: REQUEST_DELAY seconds apart.
+  - All requests are gated through a single token bucket: up to REQUEST_BURST calls
+    go out back-to-back, after which they are paced to one per REQUEST_DELAY seconds.
+  - Paginated lists fetch up to MAX_CONCURRENT_REQUESTS pages at once; the bucket
+    still paces request starts, but their round-trips overlap. Collectors that only
+    read the world/instance caches run concurrently once the friend scan is done.
   - Expensive sub-collections (world lookups, groups, avatars) are capped per cycle
     but their caches grow over time so the cap matters less each run.
   - Offline friends are fetched every OFFLINE_SCRAPE_CYCLES cycles (default: 5)
@@ -12,15 +16,37 @@ Rate limiting strategy:
 """
 
 import os
+import re
 import sys
+import json
+import atexit
+import signal
 import time
+import random
 import logging
 import base64
 import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from operator import attrgetter, methodcaller
+from email.utils import parsedate_to_datetime
 from urllib.parse import quote
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:  # optional speed-up; stdlib json accepts bytes too
+    _json_loads = json.loads
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from prometheus_client import (
+    REGISTRY,
     start_http_server,
     Gauge,
     Info,
@@ -33,10 +59,19 @@ from prometheus_client import (
 
 EXPORTER_PORT        = int(os.environ.get("EXPORTER_PORT", 9101))
 SCRAPE_INTERVAL      = int(os.environ.get("SCRAPE_INTERVAL", 120))    # seconds between cycles
-REQUEST_DELAY        = float(os.environ.get("REQUEST_DELAY", 1.5))    # seconds between API calls
+REQUEST_DELAY        = float(os.environ.get("REQUEST_DELAY", 1.5))    # long-run seconds per API call (0 = unthrottled)
+REQUEST_BURST        = int(os.environ.get("REQUEST_BURST", 5))        # calls allowed back-to-back before pacing
 MAX_WORLD_LOOKUPS    = int(os.environ.get("MAX_WORLD_LOOKUPS", 40))   # new world IDs resolved per cycle
 MAX_AVATAR_LOOKUPS   = int(os.environ.get("MAX_AVATAR_LOOKUPS", 20))  # new avatar IDs resolved per cycle
+MAX_FAVORITE_TAGS    = int(os.environ.get("MAX_FAVORITE_TAGS", 50))   # favorite tags exported (most common first)
 OFFLINE_SCRAPE_CYCLES = int(os.environ.get("OFFLINE_SCRAPE_CYCLES", 5)) # how often to fetch offline friends
+WORLD_CACHE_SIZE     = max(1, int(os.environ.get("WORLD_CACHE_SIZE", 512)))   # max worlds kept (and exported)
+INSTANCE_CACHE_SIZE  = max(1, int(os.environ.get("INSTANCE_CACHE_SIZE", 256))) # max instances kept
+INSTANCE_TTL         = int(os.environ.get("INSTANCE_TTL", 2 * SCRAPE_INTERVAL))  # seconds before an instance is re-fetched (default: every other cycle)
+CACHE_FILE           = os.environ.get("CACHE_FILE", "/var/lib/vrchat-exporter/cache.json")  # "" disables
+CACHE_FLUSH_CYCLES   = int(os.environ.get("CACHE_FLUSH_CYCLES", 10))  # cycles between cache snapshots (0 = only at exit)
+IDLE_TIMEOUT         = int(os.environ.get("IDLE_TIMEOUT", 600))       # pause polling after this long without a /metrics pull (0 = never)
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("MAX_CONCURRENT_REQUESTS", 4)) # parallel in-flight API calls
 
 VRCHAT_API_BASE = "https://api.vrchat.cloud/api/1"
 AUTH_COOKIE     = os.environ.get("VRCHAT_AUTH_COOKIE", "")
@@ -74,8 +109,10 @@ FRIEND_WORLD_GAUGE    = Gauge("vrchat_friend_by_world",    "Online friends by wo
 FRIEND_DETAIL = Gauge(
     "vrchat_friend_detail",
     "Per-friend detail (1 = online)",
-    ["display_name", "status", "platform", "world_name", "instance_type", "avatar_name"],
+    ["display_name", "status", "platform", "world_name", "instance_type"],
 )
+# Avatar kept out of FRIEND_DETAIL: it changes often and would multiply its series
+FRIEND_AVATAR = Info("vrchat_friend_avatar", "Current avatar of an online friend", ["display_name"])
 
 # ── World metrics ──
 WORLD_VISITS      = Gauge("vrchat_world_visits",       "Visit count for a cached world",    ["world_id", "world_name", "author_name"])
@@ -102,6 +139,8 @@ API_REQUEST_DURATION = Histogram(
     ["endpoint"],
     buckets=[0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0],
 )
+API_IN_FLIGHT    = Gauge("vrchat_api_requests_in_flight",         "VRChat API requests currently in flight")
+API_NOT_MODIFIED = Counter("vrchat_api_not_modified_total",       "Conditional requests answered 304 Not Modified", ["endpoint"])
 SCRAPE_ERRORS    = Counter("vrchat_scrape_errors_total",          "Failed scrape attempts",          ["endpoint"])
 SCRAPE_DURATION  = Gauge("vrchat_scrape_duration_seconds",        "Duration of last full scrape cycle")
 LAST_SCRAPE_TS   = Gauge("vrchat_last_scrape_success_timestamp",  "Unix timestamp of last successful scrape")
@@ -109,9 +148,123 @@ SCRAPE_CYCLE_NUM = Gauge("vrchat_scrape_cycle_number",            "Total complet
 
 # ─── Caches ──────────────────────────────────────────────────────────────────────
 
-_world_cache: dict[str, dict]  = {}   # world_id → {name, visits, favorites, ...}
+class LRUKCache(dict):
+    """
+    Bounded dict with LRU-K eviction (default K=2): when full, drop the key whose
+    K-th most recent access is oldest. Keys seen fewer than K times go first, so
+    one-off entries (a friend briefly visiting a random world) cannot flush the
+    entries that are used every cycle. Each scrape cycle is one correlated-
+    reference window: repeat accesses within it count once, and keys accessed
+    in it are never evicted (the cache overflows until new_cycle() instead).
+    Reads via get()/[] are not tracked — call touch() where an access should count.
+    """
+
+    def __init__(self, maxsize: int, k: int = 2, on_evict=None):
+        super().__init__()
+        self.maxsize  = maxsize
+        self.k        = k
+        self.on_evict = on_evict
+        self._history: dict[str, collections.deque] = {}
+        self._seen: dict[str, int] = {}  # key → window of its last access
+        self._window  = 0
+
+    def new_cycle(self):
+        """Open a new reference window and trim any overflow the last one left."""
+        self._window += 1
+        while len(self) > self.maxsize and self._evict():
+            pass
+
+    def _record(self, key):
+        hist = self._history.setdefault(key, collections.deque(maxlen=self.k))
+        if hist and self._seen.get(key) == self._window:
+            hist[-1] = time.monotonic()  # correlated with the last access: counts once
+        else:
+            hist.append(time.monotonic())
+        self._seen[key] = self._window
+
+    def touch(self, key):
+        if key in self:
+            self._record(key)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._record(key)
+        while len(self) > self.maxsize and self._evict():
+            pass
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._history.pop(key, None)
+        self._seen.pop(key, None)
+
+    def pop(self, key, *default):
+        self._history.pop(key, None)
+        self._seen.pop(key, None)
+        return super().pop(key, *default)
+
+    def clear(self):
+        super().clear()
+        self._history.clear()
+        self._seen.clear()
+
+    def _evict(self) -> bool:
+        """Drop one key from outside the current window; False if every key is in use."""
+        def kth_access(key):
+            hist = self._history[key]
+            return (hist[0] if len(hist) == self.k else float("-inf"), hist[-1])
+
+        candidates = [key for key, window in self._seen.items() if window != self._window]
+        if not candidates:
+            return False
+        victim = min(candidates, key=kth_access)
+        value = self.pop(victim)
+        if self.on_evict:
+            self.on_evict(victim, value)
+        return True
+
+
+def _remove_world_series(wid: str, wname: str, author: str):
+    for gauge, labels in (
+        (WORLD_VISITS,    (wid, wname, author)),
+        (WORLD_FAVORITES, (wid, wname)),
+        (WORLD_OCCUPANTS, (wid, wname)),
+        (WORLD_HEAT,      (wid, wname)),
+    ):
+        try:
+            gauge.remove(*labels)
+        except KeyError:
+            pass
+
+
+def _drop_world_series(wid: str, info: dict):
+    """Forget the Prometheus series of an evicted world so label cardinality stays bounded."""
+    children = _world_gauge_children.pop(wid, None)
+    if children:
+        _remove_world_series(wid, children[0], children[1])
+
+
+_world_cache: LRUKCache    = LRUKCache(WORLD_CACHE_SIZE, on_evict=_drop_world_series)  # world_id → {name, visits, favorites, ...}
 _avatar_cache: dict[str, dict] = {}   # avatar_id → {name, platform}
-_instance_cache: dict[str, dict] = {} # "world_id:instance_id" → {playerCount, region, type}
+_instance_cache: LRUKCache = LRUKCache(INSTANCE_CACHE_SIZE)  # "world_id:instance_id" → {playerCount, region, type}
+
+# world_id → (world_name, author_name, visits, favorites, occupants, heat child gauges)
+_world_gauge_children: dict[str, tuple] = {}
+
+# Series exported on the previous cycle (label tuple → (value, child)), diffed by _sync_series
+_friend_status_series: dict[tuple, tuple]   = {}
+_friend_platform_series: dict[tuple, tuple] = {}
+_friend_detail_series: dict[tuple, tuple]   = {}
+_friend_world_series: dict[tuple, tuple]    = {}
+_instance_series: dict[tuple, tuple]        = {}
+_favorite_series: dict[tuple, tuple]        = {}
+_friend_avatars: dict[str, str]             = {}  # display_name → avatar_name last exported
+
+# Current-user info/status/payload last exported, to skip no-op updates
+_user_state: dict[str, object] = {}
+_auth_user_validators: dict[str, str | None] = {}  # ETag/Last-Modified of the last /auth/user
+
+# Friend counts from the latest /auth/user, used to size friend-list pagination up front
+_friend_counts: dict[str, int] = {}
 
 TRUST_RANK_MAP = {
     "system_legend":    5,
@@ -122,6 +275,7 @@ TRUST_RANK_MAP = {
     "system_probable_troll": -1,
     "system_troll": -2,
 }
+_TRUST_RANK_TAGS = frozenset(TRUST_RANK_MAP)
 
 INSTANCE_TYPE_MAP = {
     "public":   "public",
@@ -131,28 +285,154 @@ INSTANCE_TYPE_MAP = {
     "group":    "group",
 }
 
+RATE_LIMIT_RETRIES = 4  # extra attempts after a 429/503, each behind the shared backoff pause
+
+NOT_MODIFIED = object()  # _get() sentinel for a 304 answer to a conditional request
+
+# Histogram label = first path segment ("/worlds/wrld_…" → "worlds"), keeping IDs out of labels
+_ENDPOINT_LABEL_RE = re.compile(r"^/([^/]+)")
+
+_stop = threading.Event()  # set by SIGTERM; ends the main loop and cuts request waits short
+_wake = threading.Event()  # set by SIGHUP (or shutdown); cuts the idle wait short
+_force = threading.Event()  # set by SIGHUP; the next cycle runs even if /metrics sits idle
+
+# ─── Rate Limiting ───────────────────────────────────────────────────────────────
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `capacity` calls may go out back-to-back, refilled
+    at `rate` tokens per second. Callers that find the bucket empty reserve a
+    future token (the count goes negative) and sleep outside the lock. Also owns
+    the shared rate-limit backoff state, so every thread sees the same pause.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate     = rate
+        self.capacity = capacity
+        self.tokens   = float(capacity)
+        self.ts       = time.monotonic()
+        self._lock    = threading.Lock()
+        self._streak  = 0    # backoff steps since the last success()
+        self._resume  = 0.0  # monotonic time the current backoff pause ends
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+
+    def acquire(self):
+        """
+        Take a token, sleeping until its slot comes up. If a backoff() lands
+        while we sleep, the slot is void: queue again behind the pause.
+        """
+        while not _stop.is_set():
+            with self._lock:
+                resume = self._resume
+                if self.rate == float("inf"):
+                    # Unthrottled (REQUEST_DELAY=0): only a backoff pause holds callers
+                    wait = resume - time.monotonic()
+                else:
+                    self._refill()
+                    self.tokens -= 1
+                    wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            if wait > 0:
+                # Jitter keeps queued callers from waking in lockstep; shutdown ends the wait
+                _stop.wait(wait + random.uniform(0, 0.2))
+            if self._resume == resume:
+                return
+
+    def wait_resume(self):
+        """Sleep out any backoff pause still pending (without taking a token)."""
+        while not _stop.is_set():
+            wait = self._resume - time.monotonic()
+            if wait <= 0:
+                return
+            _stop.wait(wait + random.uniform(0, 0.2))
+
+    def backoff(self, retry_after: float | None = None, escalate: bool = True) -> float:
+        """
+        Server said slow down: hold every caller back for `retry_after` seconds,
+        or min(60, 2**streak + jitter) if it gave no hint, where streak counts
+        backoff steps since the last success(). Threads reporting the same storm
+        while a pause is still pending share one step; escalate=False never
+        steps, so the pause stays at its current length. Waiters then drain one
+        token per 1/rate, so a single request probes the server before the rest
+        follow. Returns the pause applied.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if escalate and now >= self._resume:
+                self._streak += 1
+            delay = retry_after if retry_after is not None else min(60.0, 2 ** self._streak + random.random())
+            self._resume = max(self._resume, now + delay)
+            if self.rate != float("inf"):
+                self._refill()
+                self.tokens = min(self.tokens, -delay * self.rate)
+        return delay
+
+    def success(self):
+        """A request got through: the next backoff() starts from a short delay again."""
+        with self._lock:
+            self._streak = 0
+
+
+def _retry_after_seconds(value: str | None) -> float | None:
+    """Parse a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
 # ─── VRChat API Client ────────────────────────────────────────────────────────────
 
 class VRChatClient:
     def __init__(self):
         self.session = requests.Session()
-        self.session.headers.update({"User-Agent": USER_AGENT, "Accept": "application/json"})
+        self.session.headers.update({
+            "User-Agent":      USER_AGENT,
+            "Accept":          "application/json",
+            "Accept-Encoding": "gzip, deflate",
+            "Connection":      "keep-alive",
+        })
+        # Every call hits one host: keep a single warm pool sized for page/lookup
+        # fan-out, and let urllib3 retry gateway errors. 429/503 are retried in
+        # _get() instead, so each attempt waits on the shared bucket.
+        retry = Retry(
+            total=5,
+            backoff_factor=0.5,
+            backoff_max=60,
+            status_forcelist=[502, 504],
+            allowed_methods=["GET"],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=32, max_retries=retry)
+        self.session.mount("https://", adapter)
         self.authenticated = False
-        self._last_request_time = 0.0
+        self._bucket = TokenBucket(rate=1.0 / REQUEST_DELAY if REQUEST_DELAY > 0 else float("inf"), capacity=REQUEST_BURST)
+        # Pages, lookups and collectors each fan out; this caps the total in flight
+        self._in_flight = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
 
     def _throttle(self):
-        """Ensure at least REQUEST_DELAY seconds between requests."""
-        elapsed = time.time() - self._last_request_time
-        if elapsed < REQUEST_DELAY:
-            time.sleep(REQUEST_DELAY - elapsed)
-        self._last_request_time = time.time()
+        """Wait for a token: short bursts go straight out, sustained load is paced to REQUEST_DELAY."""
+        self._bucket.acquire()
+
+    def close(self):
+        """Release the pooled keep-alive connections."""
+        self.session.close()
 
     def authenticate(self) -> bool:
         if AUTH_COOKIE:
             log.info("Authenticating with auth cookie…")
             self.session.cookies.set("auth", AUTH_COOKIE, domain="api.vrchat.cloud")
             resp = self._get("/auth/user")
-            if resp and "id" in resp:
+            if _ok_dict(resp, "id"):
                 log.info(f"Authenticated as: {resp.get('displayName')}")
                 self.authenticated = True
                 return True
@@ -164,7 +444,7 @@ class VRChatClient:
             encoded = base64.b64encode(f"{quote(USERNAME)}:{quote(PASSWORD)}".encode()).decode()
             self.session.headers["Authorization"] = f"Basic {encoded}"
             resp = self._get("/auth/user")
-            if resp and "id" in resp:
+            if _ok_dict(resp, "id"):
                 if resp.get("requiresTwoFactorAuth"):
                     log.error("2FA required — use an auth cookie instead.")
                     return False
@@ -178,66 +458,216 @@ class VRChatClient:
         log.error("No auth configured! Set VRCHAT_AUTH_COOKIE or VRCHAT_USERNAME+VRCHAT_PASSWORD.")
         return False
 
-    def _get(self, endpoint: str, params: dict | None = None) -> dict | list | int | None:
-        self._throttle()
+    def _get(self, endpoint: str, params: dict | None = None,
+             validators: dict | None = None,
+             retries: int = RATE_LIMIT_RETRIES) -> dict | list | int | None:
+        """
+        GET an API endpoint and return the decoded JSON (None on failure).
+        If `validators` is given, its "etag"/"last_modified" values are sent as
+        If-None-Match/If-Modified-Since, refreshed from a 200 response, and a 304
+        returns NOT_MODIFIED without reading a body. A 429/503 pauses every
+        thread through the bucket and is retried up to `retries` times; only a
+        429 escalates the shared backoff, since a 503 is an outage, not us.
+        """
         url = f"{VRCHAT_API_BASE}{endpoint}"
-        t0 = time.time()
+        headers = None
+        if validators:
+            headers = {}
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+        m = _ENDPOINT_LABEL_RE.match(endpoint)
+        label = m.group(1) if m else "other"
         try:
-            resp = self.session.get(url, params=params, timeout=30)
-            duration = time.time() - t0
-            # Record histogram using a cleaned-up label (strip dynamic IDs)
-            label = endpoint.split("/")[1] if "/" in endpoint else endpoint
-            API_REQUEST_DURATION.labels(endpoint=label).observe(duration)
+            for attempt in range(retries + 1):
+                self._throttle()
+                with self._in_flight:
+                    # A pause may have started while we queued for a connection slot
+                    self._bucket.wait_resume()
+                    if _stop.is_set():
+                        return None  # shutting down: let the collectors drain
+                    t0 = time.time()
+                    with API_IN_FLIGHT.track_inprogress():
+                        resp = self.session.get(url, params=params, headers=headers, timeout=30)
+                API_REQUEST_DURATION.labels(endpoint=label).observe(time.time() - t0)
+                if resp.status_code not in (429, 503) or attempt == retries:
+                    break
+                # Back every thread off, not just this one; the retry queues behind the pause
+                delay = self._bucket.backoff(_retry_after_seconds(resp.headers.get("Retry-After")),
+                                             escalate=resp.status_code == 429)
+                log.warning(f"HTTP {resp.status_code} on {endpoint} — pausing all requests {delay:.0f}s")
 
             if resp.status_code == 200:
-                return resp.json()
+                self._bucket.success()
+                if validators is not None:
+                    validators["etag"]          = resp.headers.get("ETag")
+                    validators["last_modified"] = resp.headers.get("Last-Modified")
+                return _json_loads(resp.content)
+            elif resp.status_code == 304:
+                API_NOT_MODIFIED.labels(endpoint=label).inc()
+                return NOT_MODIFIED
             elif resp.status_code == 401:
                 log.warning(f"401 on {endpoint} — session expired")
                 self.authenticated = False
-            elif resp.status_code == 429:
-                log.warning(f"429 rate-limited on {endpoint} — sleeping 10s")
-                time.sleep(10)
+            elif resp.status_code in (429, 503):
+                log.warning(f"HTTP {resp.status_code} on {endpoint} — giving up after {retries} retries")
             else:
                 log.warning(f"HTTP {resp.status_code} on {endpoint}: {resp.text[:200]}")
         except requests.RequestException as e:
             log.error(f"Request error on {endpoint}: {e}")
+        except ValueError as e:
+            log.error(f"Invalid JSON from {endpoint}: {e}")
         return None
 
 
 # ─── Helpers ──────────────────────────────────────────────────────────────────────
 
-def _parse_instance_type(location: str) -> str:
-    """Extract human-readable instance type from a location string."""
-    if not location or location in ("private", "offline", "traveling"):
-        return location or "unknown"
-    # location format: wrld_xxx:12345~instanceType(...)
-    if "~" not in location:
-        return "public"
-    for key, label in INSTANCE_TYPE_MAP.items():
-        if f"~{key}" in location:
-            return label
-    return "unknown"
+@dataclass(slots=True)
+class FriendRow:
+    """The handful of friend fields the collectors use; the 30+ key API dict is dropped per page."""
+    display_name: str
+    status:       str
+    platform:     str
+    location:     str
+    avatar_name:  str
+
+    @classmethod
+    def from_api(cls, d: dict) -> "FriendRow":
+        return cls(
+            d.get("displayName", "unknown"),
+            d.get("status", "offline"),
+            d.get("last_platform", "unknown"),
+            d.get("location", ""),
+            d.get("currentAvatarName") or "unknown",
+        )
+
+
+_LOCATION_TAG_RE = re.compile(
+    r"~(?:(?P<type>public|hidden|friends|private|group)(?=[(~]|$)|region\((?P<region>us|use|eu|jp|aus)\))"
+)
+
+
+def _ok_list(data) -> bool:
+    """A decoded list response (type identity: the JSON decoder never yields subclasses)."""
+    return type(data) is list
 
 
-def _parse_region(location: str) -> str:
-    for region in ("us", "use", "eu", "jp", "aus"):
-        if f"~region({region})" in location:
-            return region
-    return "us"  # default
+def _ok_dict(data, key: str) -> bool:
+    """A decoded object response carrying `key` (False for None, NOT_MODIFIED, lists…)."""
+    return type(data) is dict and key in data
+
+
+def _parse_location(location: str) -> tuple[str, str]:
+    """Extract (human-readable instance type, region) from a location string in one scan."""
+    if not location or location in ("private", "offline", "traveling"):
+        return location or "unknown", "us"
+    # location format: wrld_xxx:12345~instanceType(...)~region(xx); untagged instances are public
+    instance_type, region = None, "us"  # default region
+    for m in _LOCATION_TAG_RE.finditer(location):
+        if m["region"]:
+            region = m["region"]
+        elif instance_type is None:
+            instance_type = INSTANCE_TYPE_MAP[m["type"]]
+    return instance_type or "public", region
 
 
 def _trust_rank_value(tags: list[str]) -> int:
-    for tag in reversed(tags):
-        if tag in TRUST_RANK_MAP:
-            return TRUST_RANK_MAP[tag]
-    return 0  # visitor
+    ranks = [TRUST_RANK_MAP[tag] for tag in _TRUST_RANK_TAGS.intersection(tags)]
+    if not ranks:
+        return 0  # visitor
+    # A troll flag overrides any trust level it sits next to
+    lowest = min(ranks)
+    return lowest if lowest < 0 else max(ranks)
+
+
+def _clean_label(value: str, limit: int = 64) -> str:
+    """Truncate a user-controlled string for use as a label value."""
+    return value[:limit].replace("\n", " ")
+
+
+def _sync_series(gauge: Gauge, live: dict[tuple, float], last: dict[tuple, tuple]):
+    """
+    Bring a labelled gauge in line with `live` (label-value tuple → value): remove
+    series that disappeared since the last call and set only new or changed ones.
+    `last` maps each exported label tuple to (value, child gauge) and is updated
+    in place; changed values go straight to the cached child, so .labels() only
+    runs for series that are new.
+    """
+    for labels in last.keys() - live.keys():
+        del last[labels]
+        try:
+            gauge.remove(*labels)
+        except KeyError:
+            pass
+    for labels, value in live.items():
+        prev = last.get(labels)
+        if prev is None:
+            child = gauge.labels(*labels)
+        elif prev[0] == value:
+            continue
+        else:
+            child = prev[1]
+        child.set(value)
+        last[labels] = (value, child)
+
+
+def _fetch_all_pages(client: VRChatClient, endpoint: str, params: dict,
+                     page_size: int = 100, parse=None, total: int | None = None) -> list:
+    """
+    Fetch every page of a paginated list endpoint. If `parse` is given it is
+    applied to each item as its page arrives, so raw page dicts die young.
+    If `total` is hinted up front (friend counts from /auth/user), all the pages
+    it implies go out at once with no probe page. Otherwise page 0 is fetched
+    alone to learn whether more exist. Page 0 is always requested, since the
+    hint can be stale or undercount. Further pages go out in waves that start
+    at one page and double up to MAX_CONCURRENT_REQUESTS, so a list that barely
+    spills past a page does not pay for speculative requests.
+    Stops at the first short (or failed) page.
+    """
+    base = {**params, "n": page_size}  # built once; each page only adds its offset
+
+    def fetch(offset: int) -> list | None:
+        page = client._get(endpoint, params={**base, "offset": offset})
+        if not _ok_list(page):
+            return None
+        return list(map(parse, page)) if parse else page
+
+    items: list = []
+
+    def consume(pages) -> bool:
+        """Append pages in order; True once the end of the list is reached."""
+        for page in pages:
+            if not page:
+                return True
+            items.extend(page)
+            if len(page) < page_size:
+                return True
+        return False
+
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as pool:
+        if total is not None:
+            offsets = list(range(0, max(total, 1), page_size))
+        else:
+            offsets = [0]
+        if consume(pool.map(fetch, offsets)):
+            return items
+
+        # Every page came back full: more exist than we knew of
+        offset, wave = offsets[-1] + page_size, 1
+        while True:
+            offsets = [offset + i * page_size for i in range(wave)]
+            if consume(pool.map(fetch, offsets)):
+                return items
+            offset = offsets[-1] + page_size
+            wave = min(wave * 2, MAX_CONCURRENT_REQUESTS)
 
 
 # ─── Collection Functions ─────────────────────────────────────────────────────────
 
 def collect_platform(client: VRChatClient):
     """Online user count + API health (single endpoint, no auth required)."""
-    data = client._get("/visits")
+    data = client._get("/visits", retries=0)  # health should flip on the first failure
     if data is not None:
         API_HEALTHY.set(1)
         ONLINE_USERS.set(data)
@@ -248,12 +678,16 @@ def collect_platform(client: VRChatClient):
 
 def collect_current_user(client: VRChatClient):
     """Current user info, status, trust rank, and friend ID lists."""
-    data = client._get("/auth/user")
-    if not data or "id" not in data:
+    data = client._get("/auth/user", validators=_auth_user_validators)
+    if data is NOT_MODIFIED:
+        # Nothing changed since the last 200: metrics and friend counts still hold
+        return _user_state.get("data")
+    if not _ok_dict(data, "id"):
         SCRAPE_ERRORS.labels(endpoint="auth_user").inc()
+        _friend_counts.clear()
         return None
 
-    USER_INFO.info({
+    info = {
         "display_name":       str(data.get("displayName", "")),
         "user_id":            str(data.get("id", "")),
         "username":           str(data.get("username", "")),
@@ -261,11 +695,16 @@ def collect_current_user(client: VRChatClient):
         "last_platform":      str(data.get("last_platform", "")),
         "developer_type":     str(data.get("developerType", "none")),
         "home_location":      str(data.get("homeLocation", "")),
-    })
+    }
+    # These rarely change: only touch the metrics when they do
+    if info != _user_state.get("info"):
+        USER_INFO.info(info)
+        _user_state["info"] = info
 
     status = data.get("status", "offline")
-    if status in ["active", "join me", "ask me", "busy", "offline"]:
+    if status in ["active", "join me", "ask me", "busy", "offline"] and status != _user_state.get("status"):
         USER_STATUS.state(status)
+        _user_state["status"] = status
 
     tags = data.get("tags", [])
     USER_TRUST_RANK.set(_trust_rank_value(tags))
@@ -275,11 +714,16 @@ def collect_current_user(client: VRChatClient):
     active_friends  = data.get("activeFriends", [])
     all_friends     = data.get("friends", [])
 
+    # offline=false also lists web-"active" friends; this is only a size hint
+    _friend_counts["online"]  = len(online_friends) + len(active_friends)
+    _friend_counts["offline"] = len(offline_friends)
+
     FRIENDS_ONLINE.set(len(online_friends))
     FRIENDS_OFFLINE.set(len(offline_friends))
     FRIENDS_ACTIVE.set(len(active_friends))
     FRIENDS_TOTAL.set(len(all_friends))
 
+    _user_state["data"] = data
     return data
 
 
@@ -288,135 +732,122 @@ def collect_friends_online(client: VRChatClient):
     Fetch all online friends (paginated), update status/platform/world breakdowns,
     and per-friend detail metrics.
     """
-    all_friends = []
-    offset, page_size = 0, 100
-
-    while True:
-        page = client._get("/auth/user/friends", params={
-            "offset": offset, "n": page_size, "offline": "false",
-        })
-        if not page or not isinstance(page, list):
-            break
-        all_friends.extend(page)
-        if len(page) < page_size:
-            break
-        offset += page_size
+    all_friends = _fetch_all_pages(client, "/auth/user/friends", {"offline": "false"},
+                                   parse=FriendRow.from_api, total=_friend_counts.get("online"))
 
-    # ── Aggregate counts ──
-    status_counts: dict[str, int]   = {}
-    platform_counts: dict[str, int] = {}
-    world_counts: dict[str, int]    = {}  # world_id → count
+    # Counted in C: Counter over map(attrgetter) runs no Python bytecode per friend
+    status_counts   = collections.Counter(map(attrgetter("status"), all_friends))
+    platform_counts = collections.Counter(map(attrgetter("platform"), all_friends))
 
-    FRIEND_DETAIL._metrics.clear()
+    # ── Single pass: world tallies, unknown worlds/instances, per-friend rows ──
+    world_counts = collections.Counter()  # world_id → count
+    unknown_world_ids: set[str] = set()
+    unknown_instances: dict[str, tuple[str, str, str]] = {}  # key → (world_id, instance_id, region)
+    rows: list[tuple] = []  # (name, status, platform, avatar_name, world_id, instance_type)
 
-    # ── Resolve unknown world IDs ──
-    unknown_world_ids = set()
     for f in all_friends:
-        loc = f.get("location", "")
-        if loc and loc not in ("", "private", "offline", "traveling"):
-            wid = loc.split(":")[0]
-            if wid not in _world_cache:
+        loc = f.location
+        wid = None
+        instance_type, region = _parse_location(loc)
+        if ":" in loc and loc not in ("private", "offline", "traveling"):
+            wid, rest = loc.split(":", 1)
+            iid = rest.split("~", 1)[0]
+            world_counts[wid] += 1
+            if wid in _world_cache:
+                _world_cache.touch(wid)
+            else:
                 unknown_world_ids.add(wid)
-
-    resolved = 0
-    for wid in list(unknown_world_ids):
-        if resolved >= MAX_WORLD_LOOKUPS:
-            break
-        wdata = client._get(f"/worlds/{wid}")
-        if wdata and "name" in wdata:
-            _world_cache[wid] = {
-                "name":        wdata.get("name", wid),
-                "authorName":  wdata.get("authorName", ""),
-                "visits":      wdata.get("visits", 0),
-                "favorites":   wdata.get("favorites", 0),
-                "occupants":   wdata.get("occupants", 0),
-                "heat":        wdata.get("heat", 0),
-            }
-        else:
-            _world_cache[wid] = {"name": wid, "authorName": "", "visits": 0, "favorites": 0, "occupants": 0, "heat": 0}
-        resolved += 1
-
-    # ── Resolve unknown instances ──
-    unknown_instances: dict[str, tuple[str, str]] = {}  # key → (world_id, instance_id)
-    for f in all_friends:
-        loc = f.get("location", "")
-        if loc and ":" in loc and loc not in ("private", "offline", "traveling"):
-            parts = loc.split(":")
-            wid, iid = parts[0], parts[1].split("~")[0]
             key = f"{wid}:{iid}"
-            if key not in _instance_cache:
-                unknown_instances[key] = (wid, iid)
-
-    for key, (wid, iid) in list(unknown_instances.items())[:20]:
-        inst = client._get(f"/instances/{wid}:{iid}")
-        if inst:
-            _instance_cache[key] = {
-                "playerCount":  inst.get("n_users", inst.get("userCount", 0)),
-                "region":       inst.get("region", "us"),
-                "type":         inst.get("type", "public"),
-                "world_name":   _world_cache.get(wid, {}).get("name", wid),
-                "world_id":     wid,
-                "instance_id":  iid,
-            }
+            if key in _instance_cache:
+                _instance_cache.touch(key)
+            else:
+                unknown_instances[key] = (wid, iid, region)
+
+        rows.append((f.display_name, f.status, f.platform, f.avatar_name, wid, instance_type))
+
+    # ── Resolve unknown worlds and instances as one concurrent batch ──
+    # Instance lookups don't need the world data, so neither phase waits on the
+    # other; results are merged here, single-threaded, worlds first.
+    def lookup_world(wid: str) -> tuple:
+        validators: dict = {}
+        return client._get(f"/worlds/{wid}", validators=validators), validators
+
+    def lookup_instance(item: tuple):
+        _, (wid, iid, _) = item
+        return client._get(f"/instances/{wid}:{iid}")
+
+    world_batch    = list(unknown_world_ids)[:MAX_WORLD_LOOKUPS]
+    instance_batch = list(unknown_instances.items())[:20]
+
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as pool:
+        world_results    = pool.map(lookup_world, world_batch)
+        instance_results = pool.map(lookup_instance, instance_batch)
+
+        for wid, (wdata, validators) in zip(world_batch, world_results):
+            if _ok_dict(wdata, "name"):
+                _world_cache[wid] = {
+                    "name":        wdata.get("name", wid),
+                    "authorName":  wdata.get("authorName", ""),
+                    "visits":      wdata.get("visits", 0),
+                    "favorites":   wdata.get("favorites", 0),
+                    "occupants":   wdata.get("occupants", 0),
+                    "heat":        wdata.get("heat", 0),
+                    **validators,
+                }
+            elif not _stop.is_set():  # a lookup cut short by shutdown is not a failure to remember
+                _world_cache[wid] = {"name": wid, "authorName": "", "visits": 0, "favorites": 0, "occupants": 0, "heat": 0}
+
+        for (key, (wid, iid, region)), inst in zip(instance_batch, instance_results):
+            if inst:
+                _instance_cache[key] = {
+                    "playerCount":  inst.get("n_users", inst.get("userCount", 0)),
+                    "region":       inst.get("region", region),
+                    "type":         inst.get("type", "public"),
+                    "world_name":   _world_cache.get(wid, {}).get("name", wid),
+                    "world_id":     wid,
+                    "instance_id":  iid,
+                    "last_refresh": time.monotonic(),
+                }
 
     # ── Per-friend metrics ──
-    for f in all_friends:
-        status   = f.get("status", "offline")
-        platform = f.get("last_platform", "unknown")
-        name     = f.get("displayName", "unknown")
-        avatar   = f.get("currentAvatarThumbnailImageUrl", "")  # just for existence; name below
-        avatar_name = f.get("currentAvatarName", "unknown") or "unknown"
-        loc      = f.get("location", "")
-
-        status_counts[status]     = status_counts.get(status, 0) + 1
-        platform_counts[platform] = platform_counts.get(platform, 0) + 1
-
-        if loc and loc not in ("", "private", "offline", "traveling") and ":" in loc:
-            wid = loc.split(":")[0]
-            world_counts[wid] = world_counts.get(wid, 0) + 1
-            world_name    = _world_cache.get(wid, {}).get("name", wid)
-            instance_type = _parse_instance_type(loc)
-        else:
-            world_name    = loc or "unknown"
-            instance_type = loc or "unknown"
-
-        FRIEND_DETAIL.labels(
-            display_name=name,
-            status=status,
-            platform=platform,
-            world_name=world_name,
-            instance_type=instance_type,
-            avatar_name=avatar_name,
-        ).set(1)
-
-    for status, count in status_counts.items():
-        FRIEND_STATUS_GAUGE.labels(status=status).set(count)
-    for platform, count in platform_counts.items():
-        FRIEND_PLATFORM_GAUGE.labels(platform=platform).set(count)
+    detail: dict[tuple, float] = {}
+    avatars: dict[str, str]    = {}
+    for name, status, platform, avatar_name, wid, instance_type in rows:
+        # Outside a world, _parse_location returns the location itself ("private", …)
+        world_name = _world_cache.get(wid, {}).get("name", wid) if wid else instance_type
+
+        # Order matches FRIEND_DETAIL's labelnames
+        detail[(name, status, platform, _clean_label(world_name), instance_type)] = 1
+        avatars[name] = _clean_label(avatar_name)
+    _sync_series(FRIEND_DETAIL, detail, _friend_detail_series)
+
+    # Avatar info: touch only friends whose avatar changed or who went offline
+    for name in _friend_avatars.keys() - avatars.keys():
+        FRIEND_AVATAR.remove(name)
+    for name, avatar_name in avatars.items():
+        if _friend_avatars.get(name) != avatar_name:
+            FRIEND_AVATAR.labels(display_name=name).info({"avatar_name": avatar_name})
+    _friend_avatars.clear()
+    _friend_avatars.update(avatars)
+
+    # Diffed so a status/platform nobody is on any more drops out instead of going stale
+    _sync_series(FRIEND_STATUS_GAUGE,   {(k,): v for k, v in status_counts.items()},   _friend_status_series)
+    _sync_series(FRIEND_PLATFORM_GAUGE, {(k,): v for k, v in platform_counts.items()}, _friend_platform_series)
 
     # World occupancy by friends
-    FRIEND_WORLD_GAUGE._metrics.clear()
-    for wid, count in world_counts.items():
-        wname = _world_cache.get(wid, {}).get("name", wid)
-        FRIEND_WORLD_GAUGE.labels(world_name=wname, world_id=wid).set(count)
+    _sync_series(FRIEND_WORLD_GAUGE, {
+        (_world_cache.get(wid, {}).get("name", wid), wid): count
+        for wid, count in world_counts.items()
+    }, _friend_world_series)
 
     log.info(f"Online friends: {len(all_friends)}, worlds cached: {len(_world_cache)}, instances cached: {len(_instance_cache)}")
 
 
 def collect_friends_offline(client: VRChatClient):
     """Fetch offline friends — runs less frequently (controlled by cycle counter)."""
-    all_offline = []
-    offset, page_size = 0, 100
-    while True:
-        page = client._get("/auth/user/friends", params={
-            "offset": offset, "n": page_size, "offline": "true",
-        })
-        if not page or not isinstance(page, list):
-            break
-        all_offline.extend(page)
-        if len(page) < page_size:
-            break
-        offset += page_size
+    # Only the count is needed: keep each friend's id and let the full dicts go per page
+    all_offline = _fetch_all_pages(client, "/auth/user/friends", {"offline": "true"},
+                                   parse=methodcaller("get", "id"), total=_friend_counts.get("offline"))
 
     FRIENDS_OFFLINE.set(len(all_offline))
     log.info(f"Offline friends: {len(all_offline)}")
@@ -433,12 +864,15 @@ def collect_world_metrics(client: VRChatClient):
     # Rotate: always refresh the stalest entries
     world_ids = list(_world_cache.keys())
 
-    refreshed = 0
+    refreshed, not_modified = 0, 0
     for wid in world_ids:
         if refreshed >= MAX_WORLD_LOOKUPS:
             break
-        wdata = client._get(f"/worlds/{wid}")
-        if wdata and "name" in wdata:
+        # Conditional GET: the cache entry carries its own ETag/Last-Modified
+        wdata = client._get(f"/worlds/{wid}", validators=_world_cache[wid])
+        if wdata is NOT_MODIFIED:
+            not_modified += 1
+        elif _ok_dict(wdata, "name"):
             _world_cache[wid].update({
                 "name":       wdata.get("name", wid),
                 "authorName": wdata.get("authorName", ""),
@@ -449,100 +883,207 @@ def collect_world_metrics(client: VRChatClient):
             })
         refreshed += 1
 
-    # Push all cached worlds to Prometheus
+    # Push all cached worlds to Prometheus, reusing child gauges across cycles
     for wid, info in _world_cache.items():
         wname  = info.get("name", wid)
         author = info.get("authorName", "")
-        WORLD_VISITS.labels(world_id=wid, world_name=wname, author_name=author).set(info.get("visits", 0))
-        WORLD_FAVORITES.labels(world_id=wid, world_name=wname).set(info.get("favorites", 0))
-        WORLD_OCCUPANTS.labels(world_id=wid, world_name=wname).set(info.get("occupants", 0))
-        WORLD_HEAT.labels(world_id=wid, world_name=wname).set(info.get("heat", 0))
+        children = _world_gauge_children.get(wid)
+        if children is None or children[:2] != (wname, author):
+            if children:  # renamed: drop the series under the old labels
+                _remove_world_series(wid, children[0], children[1])
+            children = _world_gauge_children[wid] = (
+                wname, author,
+                WORLD_VISITS.labels(world_id=wid, world_name=wname, author_name=author),
+                WORLD_FAVORITES.labels(world_id=wid, world_name=wname),
+                WORLD_OCCUPANTS.labels(world_id=wid, world_name=wname),
+                WORLD_HEAT.labels(world_id=wid, world_name=wname),
+            )
+        _, _, visits, favorites, occupants, heat = children
+        visits.set(info.get("visits", 0))
+        favorites.set(info.get("favorites", 0))
+        occupants.set(info.get("occupants", 0))
+        heat.set(info.get("heat", 0))
 
     WORLDS_CACHED.set(len(_world_cache))
-    log.info(f"World metrics pushed for {len(_world_cache)} cached worlds ({refreshed} refreshed)")
+    log.info(f"World metrics pushed for {len(_world_cache)} cached worlds ({refreshed} refreshed, {not_modified} unchanged)")
 
 
 def collect_instance_metrics(client: VRChatClient):
-    """Update player counts for cached instances (friends' current worlds)."""
-    INSTANCE_PLAYER_COUNT._metrics.clear()
-
+    """
+    Update player counts for cached instances (friends' current worlds).
+    Entries fetched less than INSTANCE_TTL seconds ago keep their cached count.
+    """
+    live: dict[tuple, float] = {}
+    now = time.monotonic()
     for key, info in _instance_cache.items():
         wid  = info.get("world_id", "")
         iid  = info.get("instance_id", "")
-        # Re-fetch to get live player count
-        inst = client._get(f"/instances/{wid}:{iid}")
-        if inst:
-            info["playerCount"] = inst.get("n_users", inst.get("userCount", info.get("playerCount", 0)))
-            info["region"]      = inst.get("region", info.get("region", "us"))
-            info["type"]        = inst.get("type", info.get("type", "public"))
+        # Re-fetch to get live player count, unless still fresh
+        if now - info.get("last_refresh", 0.0) >= INSTANCE_TTL:
+            inst = client._get(f"/instances/{wid}:{iid}")
+            if inst:
+                info["playerCount"]  = inst.get("n_users", inst.get("userCount", info.get("playerCount", 0)))
+                info["region"]       = inst.get("region", info.get("region", "us"))
+                info["type"]         = inst.get("type", info.get("type", "public"))
+                info["last_refresh"] = time.monotonic()
 
         wname = _world_cache.get(wid, {}).get("name", wid)
-        INSTANCE_PLAYER_COUNT.labels(
-            world_id=wid,
-            world_name=wname,
-            instance_id=iid,
-            instance_type=info.get("type", "unknown"),
-            region=info.get("region", "us"),
-        ).set(info.get("playerCount", 0))
+        labels = (wid, wname, iid, info.get("type", "unknown"), info.get("region", "us"))
+        live[labels] = info.get("playerCount", 0)
+
+    _sync_series(INSTANCE_PLAYER_COUNT, live, _instance_series)
 
 
 def collect_favorites(client: VRChatClient):
     """Fetch favorites (worlds, avatars, friends) by tag."""
-    # VRChat returns favorites in pages; we just need the tag breakdown
-    all_favs: list[dict] = []
+    # VRChat returns favorites in pages; we just need the tag breakdown, so each
+    # page is reduced to its tags on arrival
+    def extract_tag(fav: dict) -> str:
+        return fav["tags"][0] if fav.get("tags") else fav.get("type", "unknown")
+
+    all_tags: list[str] = []
     for ftype in ("world", "avatar", "friend"):
-        offset, page_size = 0, 100
-        while True:
-            page = client._get("/favorites", params={
-                "type": ftype, "offset": offset, "n": page_size,
-            })
-            if not page or not isinstance(page, list):
-                break
-            all_favs.extend(page)
-            if len(page) < page_size:
-                break
-            offset += page_size
+        all_tags.extend(_fetch_all_pages(client, "/favorites", {"type": ftype}, parse=extract_tag))
 
-    tag_counts: dict[str, int] = {}
-    for fav in all_favs:
-        tag = fav.get("tags", ["unknown"])[0] if fav.get("tags") else fav.get("type", "unknown")
-        tag_counts[tag] = tag_counts.get(tag, 0) + 1
+    tag_counts = collections.Counter(all_tags)
 
-    FAVORITES_TOTAL._metrics.clear()
-    for tag, count in tag_counts.items():
-        FAVORITES_TOTAL.labels(tag=tag).set(count)
+    # Only the most common tags become series, bounding the label set
+    _sync_series(FAVORITES_TOTAL, {
+        (tag,): count for tag, count in tag_counts.most_common(MAX_FAVORITE_TAGS)
+    }, _favorite_series)
 
-    log.info(f"Favorites: {len(all_favs)} total across world/avatar/friend")
+    log.info(f"Favorites: {len(all_tags)} total across world/avatar/friend")
 
 
 
 
+# ─── Cache Persistence ───────────────────────────────────────────────────────────
+
+def _dump_caches():
+    """Snapshot world/instance caches to CACHE_FILE (atomic replace) so a restart starts warm."""
+    if not CACHE_FILE:
+        return
+    try:
+        os.makedirs(os.path.dirname(CACHE_FILE) or ".", exist_ok=True)
+        tmp = f"{CACHE_FILE}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_json_dumps({"worlds": dict(_world_cache), "instances": dict(_instance_cache)}))
+        os.replace(tmp, CACHE_FILE)
+    except (OSError, TypeError, ValueError) as e:
+        log.warning(f"Could not save caches to {CACHE_FILE}: {e}")
+
+
+def _load_caches():
+    """Repopulate world/instance caches from the last snapshot, if any."""
+    if not CACHE_FILE or not os.path.exists(CACHE_FILE):
+        return
+    try:
+        with open(CACHE_FILE, "rb") as f:
+            data = _json_loads(f.read())
+    except (OSError, ValueError) as e:
+        log.warning(f"Could not load caches from {CACHE_FILE}: {e}")
+        return
+    if type(data) is not dict:
+        log.warning(f"Ignoring {CACHE_FILE}: expected a JSON object, got {type(data).__name__}")
+        return
+
+    def entries(section: str):
+        """The well-formed (key, dict) pairs of one snapshot section; anything else is skipped."""
+        items = data.get(section)
+        if type(items) is not dict:
+            if items is not None:
+                log.warning(f"Ignoring malformed {section!r} section in {CACHE_FILE}")
+            return
+        skipped = 0
+        for key, info in items.items():
+            if type(info) is dict:
+                yield key, info
+            else:
+                skipped += 1
+        if skipped:
+            log.warning(f"Skipped {skipped} malformed {section} entries in {CACHE_FILE}")
+
+    for wid, info in entries("worlds"):
+        _world_cache[wid] = info
+    for key, info in entries("instances"):
+        info.pop("last_refresh", None)  # monotonic clock of the previous process — re-fetch
+        _instance_cache[key] = info
+    log.info(f"Loaded {len(_world_cache)} worlds, {len(_instance_cache)} instances from {CACHE_FILE}")
+
+
 # ─── Main Scrape Loop ─────────────────────────────────────────────────────────────
 
-def scrape_all(client: VRChatClient, cycle: int):
-    start = time.time()
-    log.info(f"── Scrape cycle #{cycle} starting ──")
+def _request_stop(*_):
+    _stop.set()
+    _wake.set()
+
 
-    # Always collected every cycle
-    collect_platform(client)
-    collect_current_user(client)
-    collect_friends_online(client)
+def _request_cycle(*_):
+    _force.set()
+    _wake.set()
 
-    # World stats for worlds we know about (friends' worlds always fresh)
-    collect_world_metrics(client)
 
-    # Instance player counts for currently-active instances
-    if _instance_cache:
-        collect_instance_metrics(client)
+class PullTracker:
+    """
+    Registry collector that exports nothing but notes when /metrics was last
+    pulled, so the loop can stop polling VRChat while nobody reads the data.
+    The first pull after an idle spell wakes the loop so data catches up at once.
+    """
+
+    def __init__(self):
+        self.last_pull = time.monotonic()
+
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self.last_pull
+
+    def collect(self):
+        if IDLE_TIMEOUT and self.idle_seconds() > IDLE_TIMEOUT:
+            _wake.set()
+        self.last_pull = time.monotonic()
+        return []
+
 
-    # Offline friends — slower cadence (they don't change often)
-    if cycle % OFFLINE_SCRAPE_CYCLES == 0:
-        log.info("Collecting offline friends (cadenced)…")
-        collect_friends_offline(client)
+_pull_tracker = PullTracker()
 
-    # Favorites — every 3 cycles
-    if cycle % 3 == 0:
-        collect_favorites(client)
+
+def scrape_all(client: VRChatClient, cycle: int):
+    start = time.time()
+    log.info(f"── Scrape cycle #{cycle} starting ──")
+    _world_cache.new_cycle()
+    _instance_cache.new_cycle()
+
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS, thread_name_prefix="collector") as pool:
+        # /visits depends on nothing — overlap it with the friend scan below
+        futures = {pool.submit(collect_platform, client): collect_platform}
+
+        # Always collected every cycle; these populate the world/instance caches
+        collect_current_user(client)
+        collect_friends_online(client)
+
+        # The rest only read those caches and don't feed each other, so they run
+        # side by side — the shared token bucket still caps the overall request rate.
+        collectors = [
+            collect_world_metrics,  # world stats for worlds we know about
+        ]
+        # Instance player counts for currently-active instances
+        if _instance_cache:
+            collectors.append(collect_instance_metrics)
+        # Offline friends — slower cadence (they don't change often)
+        if cycle % OFFLINE_SCRAPE_CYCLES == 0:
+            log.info("Collecting offline friends (cadenced)…")
+            collectors.append(collect_friends_offline)
+        # Favorites — every 3 cycles
+        if cycle % 3 == 0:
+            collectors.append(collect_favorites)
+
+        futures.update({pool.submit(fn, client): fn for fn in collectors})
+        for future in as_completed(futures):
+            name = futures[future].__name__.removeprefix("collect_")
+            try:
+                future.result()
+            except Exception as e:
+                log.exception(f"Collector {name} failed: {e}")
+                SCRAPE_ERRORS.labels(endpoint=name).inc()
 
     duration = time.time() - start
     SCRAPE_DURATION.set(duration)
@@ -553,33 +1094,56 @@ def scrape_all(client: VRChatClient, cycle: int):
 
 def main():
     log.info("═══ VRChat Prometheus Exporter v2 ═══")
-    log.info(f"Port: {EXPORTER_PORT}  |  Interval: {SCRAPE_INTERVAL}s  |  Request delay: {REQUEST_DELAY}s")
+    log.info(f"Port: {EXPORTER_PORT}  |  Interval: {SCRAPE_INTERVAL}s  |  Request delay: {REQUEST_DELAY}s (burst {REQUEST_BURST})")
 
+    # prometheus_client gzips /metrics whenever the scraper sends Accept-Encoding: gzip
+    # (Prometheus always does), so the per-friend/per-world series stay cheap on the wire.
     start_http_server(EXPORTER_PORT)
+    REGISTRY.register(_pull_tracker)
     log.info(f"Metrics available at :{EXPORTER_PORT}/metrics")
 
+    _load_caches()
+    atexit.register(_dump_caches)
+    # docker stop sends SIGTERM: pending requests give up, the cycle drains,
+    # and main() returns normally so the atexit snapshot runs
+    signal.signal(signal.SIGTERM, _request_stop)
+    # SIGHUP forces an immediate cycle (docker kill -s HUP vrchat-exporter)
+    signal.signal(signal.SIGHUP, _request_cycle)
+
     client = VRChatClient()
     if not client.authenticate():
         log.error("Authentication failed. Exiting.")
         sys.exit(1)
 
     cycle = 0
-    while True:
+    while not _stop.is_set():
         try:
             if not client.authenticated:
                 log.warning("Session expired — re-authenticating…")
                 if not client.authenticate():
                     log.error("Re-auth failed. Retrying in 60s…")
-                    time.sleep(60)
+                    _stop.wait(60)
                     continue
-            cycle += 1
-            scrape_all(client, cycle)
+            forced = _force.is_set()
+            _force.clear()
+            if IDLE_TIMEOUT and cycle and not forced and _pull_tracker.idle_seconds() > IDLE_TIMEOUT:
+                log.info(f"No /metrics pull in {IDLE_TIMEOUT}s — skipping VRChat poll")
+            else:
+                cycle += 1
+                scrape_all(client, cycle)
+                if CACHE_FLUSH_CYCLES and cycle % CACHE_FLUSH_CYCLES == 0:
+                    _dump_caches()  # in case we are SIGKILLed
         except Exception as e:
             log.exception(f"Unhandled error in scrape loop: {e}")
             SCRAPE_ERRORS.labels(endpoint="main_loop").inc()
 
         log.info(f"Sleeping {SCRAPE_INTERVAL}s…")
-        time.sleep(SCRAPE_INTERVAL)
+        if _wake.wait(SCRAPE_INTERVAL) and not _stop.is_set():
+            log.info("Woken early — scraping now")
+        _wake.clear()
+
+    log.info("Shutting down.")
+    client.close()
 
 
 if __name__ == "__main__":